@@ -1,12 +1,12 @@
 #!/usr/bin/env python3
-import datetime
-import inspect
 import logging
+import os
+import pathlib
 import random
-import subprocess
+import sys
 import time
 
-import selenium.webdriver.support.expected_conditions
+import psutil
 from selenium import webdriver
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.chrome.options import Options
@@ -14,12 +14,28 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.support.expected_conditions import element_to_be_clickable
 
 WAIT_RETRY_COUNT = 1
+# NOTE: クリック可能になってから JavaScript のハンドラが落ち着くまでの待ち時間
+CLICK_SETTLE_SEC = 0.05
+RANDOM_SLEEP_RATIO = 0.8
 AGENT_NAME = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
 
+QUIET_LOGGER_LIST = [
+    logging.getLogger("urllib3.connectionpool"),
+    logging.getLogger("selenium.webdriver.common.selenium_manager"),
+    logging.getLogger("selenium.webdriver.remote.remote_connection"),
+]
+
+# NOTE: Selenium Manager が解決した (chromedriver のパス, Chrome 本体のパス)．
+# 2回目以降は起動時の解決を省略する
+binary_path_cache = None
+
 
 def create_driver_impl(profile_name, data_path, agent_name, is_headless):
+    global binary_path_cache  # noqa: PLW0603
+
     chrome_data_path = data_path / "chrome"
     log_path = data_path / "log"
 
@@ -46,12 +62,22 @@ def create_driver_impl(profile_name, data_path, agent_name, is_headless):
 
     # options.add_argument(f'--user-agent="{agent_name}"')
 
+    chromedriver_path = None
+    if binary_path_cache is not None:
+        chromedriver_path, chrome_path = binary_path_cache
+        # NOTE: chromedriver のパスを指定すると Selenium Manager が呼ばれず，Chrome 本体の
+        # パスも解決されなくなるので，前回解決された Chrome を明示的に使う
+        if chrome_path:
+            options.binary_location = chrome_path
+
     driver = webdriver.Chrome(
         service=Service(
+            executable_path=chromedriver_path,
             service_args=["--verbose", f"--log-path={str(log_path / 'webdriver.log')}"],
         ),
         options=options,
     )
+    binary_path_cache = (driver.service.path, options.binary_location)
 
     driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
     # driver.execute_cdp_cmd(
@@ -83,15 +109,18 @@ def create_driver_impl(profile_name, data_path, agent_name, is_headless):
 
 
 def create_driver(profile_name, data_path, agent_name=AGENT_NAME, is_headless=True):
+    global binary_path_cache  # noqa: PLW0603
+
     # NOTE: ルートロガーの出力レベルを変更した場合でも Selenium 関係は抑制する
-    logging.getLogger("urllib3.connectionpool").setLevel(logging.WARNING)
-    logging.getLogger("selenium.webdriver.common.selenium_manager").setLevel(logging.WARNING)
-    logging.getLogger("selenium.webdriver.remote.remote_connection").setLevel(logging.WARNING)
+    for logger in QUIET_LOGGER_LIST:
+        logger.setLevel(logging.WARNING)
 
     # NOTE: 1回だけ自動リトライ
     try:
         return create_driver_impl(profile_name, data_path, agent_name, is_headless)
     except Exception:
+        # NOTE: キャッシュした chromedriver が原因の可能性もあるので，解決し直す
+        binary_path_cache = None
         return create_driver_impl(profile_name, data_path, agent_name, is_headless)
 
 
@@ -100,19 +129,22 @@ def xpath_exists(driver, xpath):
 
 
 def get_text(driver, xpath, safe_text):
-    if len(driver.find_elements(By.XPATH, xpath)) != 0:
-        return driver.find_element(By.XPATH, xpath).text.strip()
+    elem_list = driver.find_elements(By.XPATH, xpath)
+    if len(elem_list) != 0:
+        return elem_list[0].text.strip()
     else:
         return safe_text
 
 
 def click_xpath(driver, xpath, wait=None, is_warn=True):
     if wait is not None:
-        wait.until(selenium.webdriver.support.expected_conditions.element_to_be_clickable((By.XPATH, xpath)))
-        time.sleep(0.05)
+        wait.until(element_to_be_clickable((By.XPATH, xpath)))
+        if CLICK_SETTLE_SEC > 0:
+            time.sleep(CLICK_SETTLE_SEC)
 
-    if xpath_exists(driver, xpath):
-        elem = driver.find_element(By.XPATH, xpath)
+    elem_list = driver.find_elements(By.XPATH, xpath)
+    if len(elem_list) != 0:
+        elem = elem_list[0]
         action = ActionChains(driver)
         action.move_to_element(elem)
         action.perform()
@@ -126,18 +158,21 @@ def click_xpath(driver, xpath, wait=None, is_warn=True):
 
 
 def is_display(driver, xpath):
-    return (len(driver.find_elements(By.XPATH, xpath)) != 0) and (
-        driver.find_element(By.XPATH, xpath).is_displayed()
-    )
+    elem_list = driver.find_elements(By.XPATH, xpath)
+    return (len(elem_list) != 0) and elem_list[0].is_displayed()
 
 
 def random_sleep(sec):
-    RATIO = 0.8
-
-    time.sleep((sec * RATIO) + (sec * (1 - RATIO) * 2) * random.random())  # noqa: S311
+    # NOTE: sec を中心に ±(1 - RANDOM_SLEEP_RATIO) の範囲でばらつかせる
+    time.sleep(
+        random.uniform(sec * RANDOM_SLEEP_RATIO, sec * (2 - RANDOM_SLEEP_RATIO))  # noqa: S311
+    )
 
 
 def wait_patiently(driver, wait, target):
+    # NOTE: 呼び出し元はリトライ中も変わらないので，ループの外で一度だけ取得する
+    frame = sys._getframe(1)  # noqa: SLF001
+
     error = None
     for _ in range(WAIT_RETRY_COUNT + 1):
         try:
@@ -146,9 +181,9 @@ def wait_patiently(driver, wait, target):
         except TimeoutException as e:  # noqa: PERF203
             logging.warning(
                 "タイムアウトが発生しました．(%s in %s line %d)",
-                inspect.stack()[1].function,
-                inspect.stack()[1].filename,
-                inspect.stack()[1].lineno,
+                frame.f_code.co_name,
+                frame.f_code.co_filename,
+                frame.f_lineno,
             )
             driver.refresh()
             error = e
@@ -157,7 +192,8 @@ def wait_patiently(driver, wait, target):
 
 
 def dump_page(driver, index, dump_path, stack=1):
-    name = inspect.stack()[stack].function.replace("<", "").replace(">", "")
+    frame = sys._getframe(stack)  # noqa: SLF001
+    name = frame.f_code.co_name.replace("<", "").replace(">", "")
 
     dump_path.mkdir(parents=True, exist_ok=True)
 
@@ -172,9 +208,9 @@ def dump_page(driver, index, dump_path, stack=1):
     logging.info(
         "page dump: %02d from %s in %s line %d",
         index,
-        inspect.stack()[stack].function,
-        inspect.stack()[stack].filename,
-        inspect.stack()[stack].lineno,
+        frame.f_code.co_name,
+        frame.f_code.co_filename,
+        frame.f_lineno,
     )
 
 
@@ -186,27 +222,56 @@ def clean_dump(dump_path, keep_days=1):
     if not dump_path.exists():
         return
 
-    time_threshold = datetime.timedelta(keep_days)
+    day_sec = 24 * 60 * 60
+    time_threshold = keep_days * day_sec
+    now = time.time()
+
+    # NOTE: os.scandir はディレクトリ読み出し時に種別を取得し，stat 結果もキャッシュする
+    with os.scandir(dump_path) as it:
+        for entry in it:
+            if not entry.is_file():
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            time_diff = now - mtime
+            if time_diff > time_threshold:
+                item = pathlib.Path(entry.path)
+                logging.info("remove %s [%s day(s) old].", item.absolute(), f"{int(time_diff // day_sec):,}")
 
-    for item in dump_path.iterdir():
-        if not item.is_file():
-            continue
-        time_diff = datetime.datetime.now(datetime.timezone.utc) - datetime.datetime.fromtimestamp(
-            item.stat().st_mtime, datetime.timezone.utc
-        )
-        if time_diff > time_threshold:
-            logging.info("remove %s [%s day(s) old].", item.absolute(), f"{time_diff.days:,}")
+                item.unlink(missing_ok=True)
 
-            item.unlink(missing_ok=True)
+
+def get_process_memory(process):
+    try:
+        return process.memory_full_info().pss
+    except psutil.AccessDenied:
+        # NOTE: smaps を読めない場合は RSS で代用する
+        return process.memory_info().rss
 
 
 def get_memory_info(driver):
-    total = subprocess.Popen(  # noqa: S602
-        "smem -t -c pss -P chrome | tail -n 1",  # noqa: S607
-        shell=True,
-        stdout=subprocess.PIPE,
-    ).communicate()[0]
-    total = int(str(total, "utf-8").strip()) // 1024
+    # NOTE: chromedriver とその子孫 (Chrome 本体やレンダラー) の PSS を合算する
+    process_list = []
+    # NOTE: ドライバ停止後も driver.service.process は残るが，その PID は別プロセスに
+    # 再利用されている可能性があるので，chromedriver が動作中の場合のみ辿る
+    if driver.service.process.poll() is None:
+        try:
+            driver_process = psutil.Process(driver.service.process.pid)
+            process_list = [driver_process, *driver_process.children(recursive=True)]
+        except psutil.NoSuchProcess:
+            pass
+
+    total = 0
+    for process in process_list:
+        try:
+            total += get_process_memory(process)
+        except psutil.NoSuchProcess:  # noqa: PERF203
+            pass
+        except psutil.AccessDenied:
+            logging.warning("Failed to get memory usage of PID %d", process.pid)
+    total = total // (1024 * 1024)
 
     js_heap = driver.execute_script("return window.performance.memory.usedJSHeapSize") // (1024 * 1024)
 
@@ -225,8 +290,9 @@ def warmup(driver, keyword, url_pattern, sleep_sec=3):
     driver.get("https://www.google.com/")
     time.sleep(sleep_sec)
 
-    driver.find_element(By.XPATH, '//textarea[@name="q"]').send_keys(keyword)
-    driver.find_element(By.XPATH, '//textarea[@name="q"]').send_keys(Keys.ENTER)
+    search_box = driver.find_element(By.XPATH, '//textarea[@name="q"]')
+    search_box.send_keys(keyword)
+    search_box.send_keys(Keys.ENTER)
 
     time.sleep(sleep_sec)
 
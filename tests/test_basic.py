@@ -518,6 +518,108 @@ def test_selenium_util(mocker):
         my_lib.selenium_util.create_driver("test", pathlib.Path("tests/data"))
 
 
+def test_selenium_util_clean_dump(tmp_path):
+    import os
+
+    import my_lib.selenium_util
+
+    old_time = time.time() - 2 * 24 * 60 * 60
+
+    old_file_path = tmp_path / "old.htm"
+    old_file_path.touch()
+    os.utime(old_file_path, (old_time, old_time))
+
+    new_file_path = tmp_path / "new.htm"
+    new_file_path.touch()
+
+    old_dir_path = tmp_path / "old.dir"
+    old_dir_path.mkdir()
+    os.utime(old_dir_path, (old_time, old_time))
+
+    my_lib.selenium_util.clean_dump(tmp_path, keep_days=1)
+
+    assert not old_file_path.exists()
+    assert new_file_path.exists()
+    assert old_dir_path.exists()
+
+
+def test_selenium_util_binary_path_cache(mocker, tmp_path):
+    import my_lib.selenium_util
+
+    # NOTE: キャッシュしたパスが Service と Options の両方に渡ることを確認
+    chrome_mock = mocker.patch("my_lib.selenium_util.webdriver.Chrome")
+    chrome_mock.return_value.service.path = "/new/chromedriver"
+    mocker.patch("my_lib.selenium_util.binary_path_cache", ("/cached/chromedriver", "/cached/chrome"))
+
+    my_lib.selenium_util.create_driver_impl("test", tmp_path, my_lib.selenium_util.AGENT_NAME, True)
+
+    assert chrome_mock.call_args.kwargs["service"].path == "/cached/chromedriver"
+    assert chrome_mock.call_args.kwargs["options"].binary_location == "/cached/chrome"
+    assert my_lib.selenium_util.binary_path_cache == ("/new/chromedriver", "/cached/chrome")
+
+    # NOTE: 起動に失敗した場合はキャッシュを破棄してからリトライすることを確認
+    cache_hist = []
+
+    def create_driver_impl_mock(profile_name, data_path, agent_name, is_headless):
+        cache_hist.append(my_lib.selenium_util.binary_path_cache)
+        if len(cache_hist) == 1:
+            raise RuntimeError
+        return "driver"
+
+    mocker.patch("my_lib.selenium_util.create_driver_impl", side_effect=create_driver_impl_mock)
+
+    assert my_lib.selenium_util.create_driver("test", tmp_path) == "driver"
+    assert cache_hist == [("/new/chromedriver", "/cached/chrome"), None]
+
+
+def test_selenium_util_memory_info(mocker):
+    import unittest.mock
+
+    import my_lib.selenium_util
+    import psutil
+
+    MB = 1024 * 1024
+
+    def process_mock(pid, pss=None, rss=None, pss_error=None, rss_error=None):
+        process = unittest.mock.MagicMock(pid=pid)
+        if pss_error is None:
+            process.memory_full_info.return_value.pss = pss
+        else:
+            process.memory_full_info.side_effect = pss_error(pid)
+        if rss_error is None:
+            process.memory_info.return_value.rss = rss
+        else:
+            process.memory_info.side_effect = rss_error(pid)
+        return process
+
+    driver_process = process_mock(1, pss=100 * MB)
+    driver_process.children.return_value = [
+        # NOTE: PSS を読めないので RSS で代用される
+        process_mock(2, rss=50 * MB, pss_error=psutil.AccessDenied),
+        # NOTE: 終了済みなので無視される
+        process_mock(3, pss_error=psutil.NoSuchProcess),
+        # NOTE: RSS も読めないので警告を出して無視される
+        process_mock(4, pss_error=psutil.AccessDenied, rss_error=psutil.AccessDenied),
+    ]
+    process_class_mock = mocker.patch("my_lib.selenium_util.psutil.Process", return_value=driver_process)
+    warning_mock = mocker.patch("my_lib.selenium_util.logging.warning")
+
+    driver = unittest.mock.MagicMock()
+    driver.service.process.poll.return_value = None
+    driver.execute_script.return_value = 20 * MB
+
+    assert my_lib.selenium_util.get_memory_info(driver) == {"total": 150, "js_heap": 20}
+    process_class_mock.assert_called_once_with(driver.service.process.pid)
+    warning_mock.assert_called_once()
+
+    # NOTE: chromedriver が終了済みの場合は PID を辿らない
+    process_class_mock.reset_mock()
+    driver.service.process.poll.return_value = 0
+
+    assert my_lib.selenium_util.get_memory_info(driver) == {"total": 0, "js_heap": 20}
+    process_class_mock.assert_not_called()
+
+
 def test_weather():
     import my_lib.weather
 